@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared polar chart style for the polar and radar chart apps.
+
+The fixed axes setup is applied by one function, and the subplot margins that
+tight_layout would produce are measured once per legend layout on an
+off-screen template figure. New figures reuse those margins, so the draw pass
+tight_layout needs to measure text is not repeated for every chart.
+"""
+
+from startup import lazy_import, default_font_properties
+
+np = lazy_import('numpy')
+plt = lazy_import('matplotlib.pyplot')
+
+POLAR_FIGSIZE = (8, 8)
+POLAR_DPI = 120
+DISPLAY_DPI = 200  # On-screen PNGs, rendered like st.pyplot (200 dpi, tight bounding box)
+
+# Category legends of the survey questions, measured by the process warm-up
+QUESTION_CATEGORIES = {
+    'Question 4': ['Strategic Alignment', 'Balance', 'Maximal Value'],
+    'Question 5': ['Portfolio Mindset', 'Focus', 'Agility'],
+    'Question 6': ['Evidence', 'Informal Power', 'Opinion'],
+    'Question 7': ['Cross-functional collaboration', 'Critical thinking', 'Market immersion'],
+    'Question 8': ['Culture'],
+}
+
+# Subplot margins keyed by (figsize, dpi, legend labels, legend fontsize)
+_margins_cache = {}
+
+
+# Apply the fixed radial/angular setup shared by every polar chart
+def style_polar_axes(ax):
+    ax.set_theta_direction(-1)
+    ax.set_theta_offset(np.pi / 2)
+    ax.set_ylim(0, 5)
+    ax.set_yticks(np.arange(1, 6))
+    ax.set_yticklabels([])  # Hide radial grid labels
+    ax.set_xticklabels([])  # Remove angle labels
+    ax.yaxis.grid(True, linewidth=0.75)  # Adjust the width of the circular grid lines
+    ax.xaxis.grid(False)
+    ax.spines['polar'].set_visible(False)
+
+
+# Dashed lines separating the segments of the chart
+def draw_polar_separators(ax, angles):
+    for angle in angles:
+        ax.axvline(x=angle, color='gray', linestyle='--', linewidth=1)
+
+
+# Legend in the top right corner, outside the polar axes
+def polar_legend(ax, handles, labels, fontsize=None):
+    ax.legend(handles=handles, labels=labels, loc='upper right', bbox_to_anchor=(1.1, 1.1), fontsize=fontsize, prop=default_font_properties())
+
+
+# Subplot margins tight_layout gives a styled polar figure with this legend, measured once
+def polar_margins(labels, fontsize=None, figsize=POLAR_FIGSIZE, dpi=POLAR_DPI):
+    key = (tuple(figsize), dpi, tuple(labels), fontsize)
+    if key not in _margins_cache:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.patches import Patch
+
+        # Off-screen figure so the measurement does not touch pyplot state
+        fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(projection='polar')
+        style_polar_axes(ax)
+        polar_legend(ax, [Patch() for _ in labels], list(labels), fontsize=fontsize)
+        fig.tight_layout()
+        params = fig.subplotpars
+        _margins_cache[key] = dict(left=params.left, right=params.right, bottom=params.bottom, top=params.top, wspace=params.wspace, hspace=params.hspace)
+    return _margins_cache[key]
+
+
+# Fill the margins cache for the legends of the polar chart (all categories) and the radar chart (one category)
+def warm_polar_margins():
+    for categories in QUESTION_CATEGORIES.values():
+        polar_margins(categories, fontsize=20)
+        for category in categories:
+            polar_margins([category])
+
+
+# New styled polar figure with margins precomputed for the given legend labels
+def new_polar_figure(labels, fontsize=None, figsize=POLAR_FIGSIZE, dpi=POLAR_DPI):
+    fig, ax = plt.subplots(figsize=figsize, subplot_kw={'projection': 'polar'}, dpi=dpi)
+    style_polar_axes(ax)
+    fig.subplots_adjust(**polar_margins(labels, fontsize=fontsize, figsize=figsize, dpi=dpi))
+    return fig, ax
+
+
+# Grid of styled polar axes in one figure, for comparing many charts side by side.
+# Margins are fixed fractions instead of tight_layout, leaving room for a figure legend on top.
+def new_polar_grid(n_charts, ncols=5, cell_size=3.2, dpi=POLAR_DPI):
+    ncols = max(1, min(ncols, n_charts))
+    nrows = -(-n_charts // ncols)  # Ceiling division
+    legend_height = 1.2  # Inches reserved above the grid for the legend and two-line titles of the top row
+    fig_height = nrows * cell_size + legend_height
+    fig, axes = plt.subplots(nrows, ncols, figsize=(ncols * cell_size, fig_height), subplot_kw={'projection': 'polar'}, dpi=dpi, squeeze=False)
+    axes = axes.ravel()
+    for ax in axes[:n_charts]:
+        style_polar_axes(ax)
+    for ax in axes[n_charts:]:
+        fig.delaxes(ax)
+    fig.subplots_adjust(left=0.03, right=0.97, bottom=0.03 * cell_size / fig_height, top=1 - legend_height / fig_height, wspace=0.25, hspace=0.45)
+    return fig, list(axes[:n_charts])
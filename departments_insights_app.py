@@ -7,11 +7,18 @@ Created on Mon Sep 23 17:21:18 2024
 """
 
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
-import numpy as np
 import io
+from startup import lazy_import, start_warm_up, show_startup_report
+from chart_style import DISPLAY_DPI
+from vega_charts import use_browser_rendering, stacked_percentage_spec
+from pipeline import source, stage, discard, cached, prune
+from upload_store import MEMORY_BUDGET_MB, memory_budget_bytes, uploader_key, take_uploads, stored_uploads, remove_upload, rejected_uploads, show_memory_report
+
+# Heavy modules are imported on first use (matplotlib with the non-interactive Agg backend)
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
+np = lazy_import('numpy')
+openpyxl = lazy_import('openpyxl')
 
 # Integration of Segoe UI web fonts
 st.markdown("""
@@ -36,11 +43,16 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Define a function to extract data from the uploaded Excel file
-def extract_data(df, department_name, sheet_name, start_row, end_row, columns):
-    statements = df.iloc[start_row:end_row, columns['statement']].values
-    responses = df.iloc[start_row:end_row, columns['responses']].values
-    weighted_average = df.iloc[start_row:end_row, columns['weighted_average']].values
+# Define a function to extract data from a question sheet of an uploaded Excel file.
+# Only the needed cells are read; rows are numbered as in pd.read_excel with a header row,
+# so data row r is Excel row r + 2.
+def extract_data(worksheet, department_name, sheet_name, start_row, end_row, columns):
+    width = columns['weighted_average'] + 1
+    rows = worksheet.iter_rows(min_row=start_row + 2, max_row=end_row + 1, max_col=width, values_only=True)
+    cells = np.array([list(row) + [None] * (width - len(row)) for row in rows], dtype=object).reshape(-1, width)
+    statements = cells[:, columns['statement']]
+    responses = pd.DataFrame(cells[:, columns['responses']]).apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float32')
+    weighted_average = pd.to_numeric(pd.Series(cells[:, columns['weighted_average']]), errors='coerce').to_numpy(dtype='float32')
 
     data = {
         "Statement": statements,
@@ -58,73 +70,169 @@ def extract_data(df, department_name, sheet_name, start_row, end_row, columns):
     
     return department_df
 
+# Store the text columns as categoricals; the counts are already float32
+def compact(df):
+    return df.astype({'Statement': 'category', 'Department': 'category', 'Question': 'category'})
+
+sheets_info = {
+    "Question 4": {"start_row": 2, "end_row": 14, "columns": {"statement": 0, "responses": slice(1, 6), "weighted_average": 6}},
+    "Question 5": {"start_row": 2, "end_row": 15, "columns": {"statement": 0, "responses": slice(1, 6), "weighted_average": 6}},
+    "Question 6": {"start_row": 2, "end_row": 14, "columns": {"statement": 0, "responses": slice(1, 6), "weighted_average": 6}},
+    "Question 7": {"start_row": 2, "end_row": 14, "columns": {"statement": 0, "responses": slice(1, 6), "weighted_average": 6}},
+}
+
+response_colors = ["#C00000", "#DE7E35", "#FFFBB9", "#A7C23D", "#4F7A27"]
+
+# Pipeline stages (load -> extract -> aggregate -> render), memoized per session by pipeline.stage
+
+# Extract every question sheet of one department workbook spilled to disk
+def extract_department(path, department_name):
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet_dfs = [extract_data(workbook[sheet], department_name, sheet, info['start_row'], info['end_row'], info['columns']) for sheet, info in sheets_info.items()]
+    finally:
+        workbook.close()
+    return compact(pd.concat(sheet_dfs, ignore_index=True))
+
+def combine_departments(*department_dfs):
+    if not department_dfs:
+        return pd.DataFrame()
+    return compact(pd.concat(department_dfs, ignore_index=True))
+
+# Percentage of each response per department for one statement
+def statement_percentages(combined_df, statement):
+    df_statement = combined_df[combined_df['Statement'] == statement]
+    # Plain strings, so the pivot only has the departments and questions of this statement
+    df_statement = df_statement.astype({'Department': str, 'Question': str})
+    df_statement = df_statement.pivot(index='Department', columns='Question', values=["Strongly Disagree", "Disagree", "Neutral", "Agree", "Strongly Agree"])
+    df_statement.columns = [col[0] for col in df_statement.columns]
+
+    return df_statement.div(df_statement.sum(axis=1), axis=0) * 100
+
+# Render stage: high DPI (600) for the download, DISPLAY_DPI for the screen
+def bar_chart_png(df_percentage, statement, dpi=600):
+    fig, ax = plt.subplots(figsize=(12, 8), dpi=300)  # Increase DPI for high quality
+    bars = df_percentage.plot(kind='barh', stacked=True, color=response_colors, ax=ax, zorder=3)
+
+    ax.xaxis.grid(True, color='gray', linestyle='--', linewidth=0.5, zorder=1)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+
+    ax.set_title(statement, fontsize=16, weight='bold', pad=20)
+    ax.set_xlabel('Percentage of Responses', fontsize=14)
+    ax.set_ylabel('Department', fontsize=14)
+    ax.set_xticks(np.arange(0, 101, 10))
+    ax.set_xticklabels([f'{i}%' for i in range(0, 101, 10)])
+    ax.set_yticklabels(df_percentage.index)
+    ax.yaxis.set_ticks_position('none')
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.15), ncol=5, title='Response', frameon=False)
+
+    plt.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return buf.getvalue()
+
+# Keep a rendered PNG cached only if it fits in the budget; returns the updated memory use
+def keep_within_budget(stage_name, png, used_bytes, budget):
+    if used_bytes + len(png) > budget:
+        discard(stage_name)
+        st.caption("This chart is not kept in memory between reruns: the session memory budget is reached.")
+        return used_bytes
+    return used_bytes + len(png)
+
 # Streamlit app starts here
+start_warm_up()
 st.title("Bar Chart Generator")
+show_startup_report()
+browser_rendering = use_browser_rendering()
 
-uploaded_files = st.file_uploader("Upload Excel files for each department", type=["xlsx"], accept_multiple_files=True)
+uploaded_files = st.file_uploader("Upload Excel files for each department", type=["xlsx"], accept_multiple_files=True, key=uploader_key('department_uploads'))
 if uploaded_files:
-    sheets_info = {
-        "Question 4": {"start_row": 2, "end_row": 14, "columns": {"statement": 0, "responses": slice(1, 6), "weighted_average": 6}},
-        "Question 5": {"start_row": 2, "end_row": 15, "columns": {"statement": 0, "responses": slice(1, 6), "weighted_average": 6}},
-        "Question 6": {"start_row": 2, "end_row": 14, "columns": {"statement": 0, "responses": slice(1, 6), "weighted_average": 6}},
-        "Question 7": {"start_row": 2, "end_row": 14, "columns": {"statement": 0, "responses": slice(1, 6), "weighted_average": 6}},
-    }
-
-    combined_df = pd.DataFrame()
-
-    for uploaded_file in uploaded_files:
-        department_name = st.text_input(f"Enter the department name for file: {uploaded_file.name}")
-        if department_name:
-            for sheet, info in sheets_info.items():
-                df = pd.read_excel(uploaded_file, sheet_name=sheet)
-                sheet_df = extract_data(df, department_name, sheet, info['start_row'], info['end_row'], info['columns'])
-                combined_df = pd.concat([combined_df, sheet_df], ignore_index=True)
-
-    statement_options = combined_df["Statement"].unique()
-    selected_statement = st.selectbox("Select a statement for visualization", statement_options)
+    # Spill the uploads to the session's temp store and reset the uploader; the app reads from the store only
+    take_uploads(uploaded_files)
+
+uploads = stored_uploads()
+if uploads:
+    # Only the needed cells of each workbook are kept in memory, within the session budget.
+    # Only the stages downstream of a changed input or name are recomputed on a rerun.
+    budget = memory_budget_bytes()
+    rejected = rejected_uploads()
+    # Room for the rendered charts, sized from the last render
+    render_bytes = sum(len(result.value) for result in (cached('display_png'), cached('png')) if result is not None)
+    used_bytes = 0
+    department_stages = []
+    department_dfs = []
+    for record in uploads:
+        name_column, remove_column = st.columns([5, 1])
+        department_name = name_column.text_input(f"Enter the department name for file: {record['name']}", key=f"department_name_{record['token']}")
+        if remove_column.button("Remove", key=f"remove_{record['token']}"):
+            remove_upload(record['token'])
+            st.rerun()
+        if not department_name:
+            continue
+        if record['token'] in rejected:
+            st.warning(f"Skipping {record['name']}: it does not fit in the session memory budget of {MEMORY_BUDGET_MB:.0f} MB.")
+            continue
+        stage_name = f"department_{record['token']}"
+        workbook = source(f"workbook_{record['token']}", record['path'], token=record['token'])
+        department = stage(stage_name, extract_department, workbook, department_name=department_name)
+        # Counted twice: the department's own table and its rows in the combined table
+        department_bytes = 2 * department.value.memory_usage(deep=True).sum()
+        if used_bytes + department_bytes + render_bytes > budget:
+            discard(stage_name)
+            rejected.add(record['token'])
+            st.warning(f"Skipping {record['name']}: it does not fit in the session memory budget of {MEMORY_BUDGET_MB:.0f} MB.")
+            continue
+        used_bytes += department_bytes
+        department_stages.append(stage_name)
+        department_dfs.append(department)
+    prune('department_', department_stages)
+
+    combined = stage('combined', combine_departments, *department_dfs)
+    combined_df = combined.value
+    used_bytes = sum(department.value.memory_usage(deep=True).sum() for department in department_dfs) + combined_df.memory_usage(deep=True).sum()
+
+    if combined_df.empty:
+        st.info("Enter a department name for at least one file.")
+        selected_statement = None
+    else:
+        statement_options = combined_df["Statement"].unique().tolist()
+        selected_statement = st.selectbox("Select a statement for visualization", statement_options)
 
     if selected_statement:
         st.write(f"Generating chart for: {selected_statement}")
-        df_statement = combined_df[combined_df['Statement'] == selected_statement]
-        df_statement = df_statement.pivot(index='Department', columns='Question', values=["Strongly Disagree", "Disagree", "Neutral", "Agree", "Strongly Agree"])
-        df_statement.columns = [col[0] for col in df_statement.columns]
-
-        df_percentage = df_statement.div(df_statement.sum(axis=1), axis=0) * 100
-
-        fig, ax = plt.subplots(figsize=(12, 8), dpi=300)  # Increase DPI for high quality
-        bars = df_percentage.plot(kind='barh', stacked=True, color=["#C00000", "#DE7E35", "#FFFBB9", "#A7C23D", "#4F7A27"], ax=ax, zorder=3)
-
-        ax.xaxis.grid(True, color='gray', linestyle='--', linewidth=0.5, zorder=1)
-        for spine in ax.spines.values():
-            spine.set_visible(False)
-
-        ax.set_title(selected_statement, fontsize=16, weight='bold', pad=20)
-        ax.set_xlabel('Percentage of Responses', fontsize=14)
-        ax.set_ylabel('Department', fontsize=14)
-        ax.set_xticks(np.arange(0, 101, 10))
-        ax.set_xticklabels([f'{i}%' for i in range(0, 101, 10)])
-        ax.set_yticklabels(df_percentage.index)
-        ax.yaxis.set_ticks_position('none')
-        ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.15), ncol=5, title='Response', frameon=False)
-
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=600, bbox_inches='tight')
-        buf.seek(0)
-        st.pyplot(fig)
-
-        st.download_button(
-            label="Download chart as PNG",
-            data=buf,
-            file_name=f"{selected_statement}.png",
-            mime="image/png"
-        )
+        percentages = stage('percentages', statement_percentages, combined, statement=selected_statement)
+        used_bytes += percentages.value.memory_usage(deep=True).sum()
+
+        # In the browser only the percentage table is sent; matplotlib is used for the export
+        if browser_rendering:
+            st.vega_lite_chart(stacked_percentage_spec(percentages.value, selected_statement, response_colors), width='content')
+            export = st.checkbox("Prepare high-quality PNG for download")
+        else:
+            display_png = stage('display_png', bar_chart_png, percentages, statement=selected_statement, dpi=DISPLAY_DPI).value
+            used_bytes = keep_within_budget('display_png', display_png, used_bytes, budget)
+            st.image(display_png)
+            export = True
+
+        if export:
+            png = stage('png', bar_chart_png, percentages, statement=selected_statement).value
+            used_bytes = keep_within_budget('png', png, used_bytes, budget)
+
+            st.download_button(
+                label="Download chart as PNG",
+                data=png,
+                file_name=f"{selected_statement}.png",
+                mime="image/png"
+            )
+
+    show_memory_report(used_bytes)
 
     st.markdown("""
     ### Instructions:
-    1. Upload the Excel files for each department.
+    1. Upload the Excel files for each department; they are stored for this session and can be dropped with Remove.
     2. Enter the department name for each file.
     3. Select a statement from the dropdown menu.
-    4. View the bar chart and download it in high quality.
+    4. View the bar chart and, in interactive mode, tick the export box to download it in high quality.
     """)
@@ -7,87 +7,104 @@ Created on Thu Aug 29 14:53:39 2024
 """
 
 import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
 import io
+from startup import lazy_import, default_font_properties, start_warm_up, show_startup_report
+from chart_style import DISPLAY_DPI, new_polar_figure, draw_polar_separators, polar_legend
+from vega_charts import use_browser_rendering, radar_chart_spec
+from pipeline import upload_source, stage, prune
 
-# Load font properties for Segoe UI
-font_properties = FontProperties(family='sans-serif', size=18)
+# Heavy modules are imported on first use
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+plt = lazy_import('matplotlib.pyplot')
 
-# Function to create radar chart for a given question's data
-def create_radar_chart(data, categories, title, sheet_name):
-    colors = ['#7CAEAD', '#917670', '#CDB486']
-    light_colors = ['#C0E4E0', '#D6CCC8', '#E4D9D3']
+colors = ['#7CAEAD', '#917670', '#CDB486']
+light_colors = ['#C0E4E0', '#D6CCC8', '#E4D9D3']
+
+# Function to draw the radar chart of a question's data with category k highlighted
+def radar_chart_figure(data, categories, k):
+    font_properties = default_font_properties()
+    category = categories[k]
 
-    figsize = (8, 8)
-    dpi = 120
     segment_angle = 2 * np.pi / len(categories)
     angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False)
 
-    for k, category in enumerate(categories):
-        fig, ax = plt.subplots(figsize=figsize, subplot_kw={'projection': 'polar'}, dpi=dpi)
-        ax.set_theta_direction(-1)
-        ax.set_theta_offset(np.pi / 2)
-        ax.set_ylim(0, 5)
-        ax.set_yticks(np.arange(1, 6))
-        ax.set_yticklabels([])  # Hide radial grid labels
-        ax.set_xticklabels([])  # Remove angle labels
-        ax.yaxis.grid(True, linewidth=0.75)
-        ax.xaxis.grid(False)
-        ax.spines['polar'].set_visible(False)
-
-        bars = []
-
-        for i, (cat, values) in enumerate(data.items()):
-            base_angle = angles[i]
-            sub_segment_width = segment_angle / len(values)
-            offset = 0.21 if len(values) == 5 else 0.265
+    fig, ax = new_polar_figure([category])
+
+    bars = []
+
+    for i, (cat, values) in enumerate(data.items()):
+        base_angle = angles[i]
+        sub_segment_width = segment_angle / len(values)
+        offset = 0.21 if len(values) == 5 else 0.265
+        
+        for j, value in enumerate(values):
+            sub_angle = base_angle + offset + j * sub_segment_width
+            color = colors[i] if i == k else light_colors[i]
+            bar = ax.bar(sub_angle, value, width=sub_segment_width, color=color, alpha=0.75, edgecolor='white', label=cat if (j == 0 and i == k) else "")
             
-            for j, value in enumerate(values):
-                sub_angle = base_angle + offset + j * sub_segment_width
-                color = colors[i] if i == k else light_colors[i]
-                bar = ax.bar(sub_angle, value, width=sub_segment_width, color=color, alpha=0.75, edgecolor='white', label=cat if (j == 0 and i == k) else "")
+            if i == k:
+                ax.text(sub_angle, value - 0.75, f'{value:.2f}', ha='center', va='center', color='black', fontweight='bold', fontsize=17, fontproperties=font_properties)
                 
-                if i == k:
-                    ax.text(sub_angle, value - 0.75, f'{value:.2f}', ha='center', va='center', color='black', fontweight='bold', fontsize=17, fontproperties=font_properties)
-                    
-                    if j == 0:
-                        bars.append(bar)
+                if j == 0:
+                    bars.append(bar)
 
-        for angle in angles:
-            ax.axvline(x=angle, color='gray', linestyle='--', linewidth=1)
+    draw_polar_separators(ax, angles)
 
-        ax.legend(handles=[b[0] for b in bars], labels=[category], loc='upper right', bbox_to_anchor=(1.1, 1.1), prop=font_properties)
+    # Figure margins for this legend were precomputed by new_polar_figure
+    polar_legend(ax, [b[0] for b in bars], [category])
 
-        plt.tight_layout()
-        fig.patch.set_alpha(0.0)
-        ax.patch.set_alpha(1.0)
-        
-        st.pyplot(fig)
+    fig.patch.set_alpha(0.0)
+    ax.patch.set_alpha(1.0)
+
+    return fig
+
+# Render stage: the chart with category k highlighted as a high-res PNG (or at DISPLAY_DPI for the screen)
+def radar_chart_png(question_data, highlight, dpi=600, bbox_inches=None):
+    data = question_data[0]
+    fig = radar_chart_figure(data, list(data.keys()), highlight)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches=bbox_inches)
+    plt.close(fig)
+    return buf.getvalue()
+
+# Function to show the radar chart for each category of a question's data
+def create_radar_chart(question_data, sheet_name, browser_rendering=False, export=True):
+    data = question_data.value[0]
+    categories = list(data.keys())
+    used_stages = []
+
+    for k, category in enumerate(categories):
+        # In the browser only the statement values are sent; matplotlib is used for the export
+        if browser_rendering:
+            st.vega_lite_chart(radar_chart_spec(data, categories, k, colors, light_colors), width='content')
+            if not export:
+                continue
+        else:
+            used_stages.append(f'display_png_{k}')
+            st.image(stage(f'display_png_{k}', radar_chart_png, question_data, highlight=k, dpi=DISPLAY_DPI, bbox_inches='tight').value)
+
+        # Rendered once per input; reruns reuse the cached PNG
+        used_stages.append(f'png_{k}')
+        png = stage(f'png_{k}', radar_chart_png, question_data, highlight=k).value
 
-        # Save the figure as a downloadable high-res PNG
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=600)  # Save as high-res PNG
-        buf.seek(0)  # Move the buffer's position to the beginning
         st.download_button(
             label=f"Download Chart for {category}",
-            data=buf,
+            data=png,
             file_name=f"radar_chart_{sheet_name}_{category}.png",
             mime="image/png"
         )
 
-# Streamlit App
-st.title("Radar Chart Visualization App")
+    # Drop PNGs of categories or rendering modes this run did not use
+    prune('display_png_', used_stages)
+    prune('png_', used_stages)
 
-# File uploader
-uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx"])
+def read_sheet(workbook, sheet_name):
+    workbook.seek(0)
+    return pd.read_excel(workbook, sheet_name=sheet_name, header=None)
 
-if uploaded_file:
-    sheet_name = st.selectbox('Select the sheet name', ['Question 4', 'Question 5', 'Question 6', 'Question 7', 'Question 8'])
-    df = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=None)
-    
+# Extract stage: statement values, category averages and chart title for the selected question
+def extract_question_data(df, sheet_name):
     if sheet_name == 'Question 4':
         data_q4 = {
             'Strategic Alignment': df.iloc[3:7, 12].values,
@@ -100,8 +117,7 @@ if uploaded_file:
         
         averages_q4 = {key: (np.mean(transformed_balance_values) if key == 'Balance' else np.mean(values)) for key, values in data_q4.items()}
         
-        categories_q4 = list(data_q4.keys())
-        create_radar_chart(data_q4, categories_q4, "Portfolio Success Visualization", sheet_name)
+        return data_q4, averages_q4, "Portfolio Success Visualization"
         
     elif sheet_name == 'Question 5':
         data_q5 = {
@@ -110,8 +126,7 @@ if uploaded_file:
             'Agility': df.iloc[12:16, 12].values
         }
         averages_q5 = {key: np.mean(values) for key, values in data_q5.items()}
-        categories_q5 = list(data_q5.keys())
-        create_radar_chart(data_q5, categories_q5, "Effectiveness Visualization", sheet_name)
+        return data_q5, averages_q5, "Effectiveness Visualization"
         
     elif sheet_name == 'Question 6':
         data_q6 = {
@@ -120,8 +135,7 @@ if uploaded_file:
             'Opinion': df.iloc[11:15, 12].values
         }
         averages_q6 = {key: np.mean(values) for key, values in data_q6.items()}
-        categories_q6 = list(data_q6.keys())
-        create_radar_chart(data_q6, categories_q6, "Decision Making Visualization", sheet_name)
+        return data_q6, averages_q6, "Decision Making Visualization"
         
     elif sheet_name == 'Question 7':
         data_q7 = {
@@ -130,21 +144,38 @@ if uploaded_file:
             'Market immersion': df.iloc[11:15, 12].values
         }
         averages_q7 = {key: np.mean(values) for key, values in data_q7.items()}
-        categories_q7 = list(data_q7.keys())
-        create_radar_chart(data_q7, categories_q7, "Input Processes Visualization", sheet_name)
+        return data_q7, averages_q7, "Input Processes Visualization"
         
     elif sheet_name == 'Question 8':
         data_q8 = {
             'Culture': df.iloc[3:7, 12].values
         }
         averages_q8 = {key: np.mean(values) for key, values in data_q8.items()}
-        categories_q8 = list(data_q8.keys())
-        create_radar_chart(data_q8, categories_q8, "Collective Ambition Visualization", sheet_name)
+        return data_q8, averages_q8, "Collective Ambition Visualization"
+
+# Streamlit App
+start_warm_up()
+st.title("Radar Chart Visualization App")
+show_startup_report()
+browser_rendering = use_browser_rendering()
+
+# File uploader
+uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx"])
+
+if uploaded_file:
+    sheet_name = st.selectbox('Select the sheet name', ['Question 4', 'Question 5', 'Question 6', 'Question 7', 'Question 8'])
+    export = not browser_rendering or st.checkbox("Prepare high-quality PNGs for download")
+
+    # Only the stages downstream of a changed input are recomputed on a rerun
+    workbook = upload_source('workbook', uploaded_file)
+    df = stage('sheet', read_sheet, workbook, sheet_name=sheet_name)
+    question_data = stage('question_data', extract_question_data, df, sheet_name=sheet_name)
+    create_radar_chart(question_data, sheet_name, browser_rendering, export)
 
     # Show instructions
     st.markdown("""
     ### Instructions:
     1. Upload an Excel file containing the data.
     2. Select the appropriate sheet name.
-    3. View and download the resulting radar chart for each category in high quality.
+    3. View the radar chart for each category and, in interactive mode, tick the export box to download them in high quality.
     """)
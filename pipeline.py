@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Session-scoped memoization of the app pipelines (load -> extract -> aggregate -> render).
+
+Every stage result carries a key derived from its name, its parameters and
+the keys of the stages it depends on. A stage is only recomputed when that key
+changes, so a widget change reruns just the stages downstream of it. The
+latest result of each stage is kept in st.session_state.
+"""
+
+import hashlib
+from collections import namedtuple
+
+import streamlit as st
+
+StageResult = namedtuple('StageResult', ['key', 'value'])
+
+_CACHE_KEY = '_pipeline_cache'
+
+
+def _hash(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+# Pipeline input, e.g. the bytes of an uploaded file; its key is the hash of the content,
+# or the given token when the value is only a reference to the data (such as a file path)
+def source(name, data, token=None):
+    if token is None:
+        token = hashlib.sha1(data).hexdigest()
+    return StageResult(_hash(name, token), data)
+
+
+# Stable identifier of an st.file_uploader file; the upload id where Streamlit provides one
+def upload_token(uploaded_file):
+    return getattr(uploaded_file, 'file_id', None) or f'{uploaded_file.name}:{uploaded_file.size}'
+
+
+# Pipeline input for an uploaded file, keyed on its upload id so its bytes are not copied and hashed every rerun
+def upload_source(name, uploaded_file):
+    return source(name, uploaded_file, token=upload_token(uploaded_file))
+
+
+# Run fn(*inputs, **params) unless this stage already ran with the same upstream keys and params.
+# Inputs must be StageResults; params must have a stable repr (strings, numbers, tuples).
+def stage(name, fn, *inputs, **params):
+    key = _hash(name, tuple(upstream.key for upstream in inputs), sorted(params.items()))
+    cache = st.session_state.setdefault(_CACHE_KEY, {})
+    cached = cache.get(name)
+    if cached is not None and cached.key == key:
+        return cached
+    result = StageResult(key, fn(*(upstream.value for upstream in inputs), **params))
+    cache[name] = result
+    return result
+
+
+# Forget a cached stage, e.g. a result that was rejected after it was computed
+def discard(name):
+    st.session_state.get(_CACHE_KEY, {}).pop(name, None)
+
+
+# Latest cached result of a stage, or None
+def cached(name):
+    return st.session_state.get(_CACHE_KEY, {}).get(name)
+
+
+# Drop cached stages whose name starts with prefix and is not in keep, e.g. for removed uploads
+def prune(prefix, keep):
+    cache = st.session_state.get(_CACHE_KEY, {})
+    for name in [name for name in cache if name.startswith(prefix) and name not in keep]:
+        del cache[name]
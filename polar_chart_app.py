@@ -6,31 +6,24 @@ Created on Fri Sep 20 15:22:43 2024
 @author: bramhendriksz
 """
 
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-
 import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
 import io  # Import io for in-memory file handling
+import textwrap
+from startup import lazy_import, default_font_properties, start_warm_up, show_startup_report
+from chart_style import QUESTION_CATEGORIES, DISPLAY_DPI, new_polar_figure, new_polar_grid, draw_polar_separators, polar_legend
+from vega_charts import use_browser_rendering, polar_chart_spec
+from pipeline import upload_source, stage, prune
 
-# Define font properties for a general sans-serif font (alternative to Segoe UI)
-font_properties = FontProperties(family='sans-serif', size=18)
+# Heavy modules are imported on first use
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+plt = lazy_import('matplotlib.pyplot')
 
 # Function to create polar chart
 def create_polar_chart(data, averages, categories, colors, title):
-    fig, ax = plt.subplots(figsize=(8, 8), subplot_kw={'projection': 'polar'}, dpi=120)
-    ax.set_theta_direction(-1)
-    ax.set_theta_offset(np.pi / 2)
-    ax.set_ylim(0, 5)
-    ax.set_yticks(np.arange(1, 6))
-    ax.set_yticklabels([], fontproperties=font_properties)  # Hide radial grid labels
-    ax.set_xticklabels([], fontproperties=font_properties)  # Remove angle labels
-    ax.yaxis.grid(True, linewidth=0.75)  # Adjust the width of the circular grid lines
-    ax.xaxis.grid(False)
-    ax.spines['polar'].set_visible(False)
+    # General sans-serif font (alternative to Segoe UI)
+    font_properties = default_font_properties()
+    fig, ax = new_polar_figure(categories, fontsize=20)
 
     # The angle for each segment
     segment_angle = 2 * np.pi / len(categories)
@@ -51,13 +44,10 @@ def create_polar_chart(data, averages, categories, colors, title):
 
     # Add separation lines at the edges of each bar
     separation_angles = [(angle - segment_angle / 2) % (2 * np.pi) for angle in angles] + [2 * np.pi]
-    for angle in separation_angles:
-        ax.axvline(x=angle, color='gray', linestyle='--', linewidth=1)
-
-    # Add a legend
-    ax.legend(handles=[h[0] for h in legend_handles], labels=categories, loc='upper right', bbox_to_anchor=(1.1, 1.1), fontsize=20, prop=font_properties)
+    draw_polar_separators(ax, separation_angles)
 
-    plt.tight_layout()
+    # Add a legend; the figure margins were precomputed for it by new_polar_figure
+    polar_legend(ax, [h[0] for h in legend_handles], categories, fontsize=20)
 
     # Set transparent background for the figure
     fig.patch.set_alpha(0.0)  # Make the figure background transparent
@@ -65,89 +55,224 @@ def create_polar_chart(data, averages, categories, colors, title):
 
     return fig
 
-# Streamlit app starts here
-st.title("Polar Chart App")
+# Define the structure for each question
+questions = {
+    'Question 4': {
+        'categories': QUESTION_CATEGORIES['Question 4'],
+        'colors': ['#7CAEAD', '#917670', '#CDB486'],
+        'data_ranges': [(3, 7), (7, 11), (11, 15)],
+        'transform': lambda values: np.stack([values[..., 0], values[..., 3], 5 - values[..., 1], 5 - values[..., 2]], axis=-1)  # Specific transformation for balance, per row of a matrix too
+    },
+    'Question 5': {
+        'categories': QUESTION_CATEGORIES['Question 5'],
+        'colors': ['#7CAEAD', '#917670', '#CDB486'],
+        'data_ranges': [(3, 8), (8, 12), (12, 16)]
+    },
+    'Question 6': {
+        'categories': QUESTION_CATEGORIES['Question 6'],
+        'colors': ['#7CAEAD', '#917670', '#CDB486'],
+        'data_ranges': [(3, 7), (7, 11), (11, 15)]
+    },
+    'Question 7': {
+        'categories': QUESTION_CATEGORIES['Question 7'],
+        'colors': ['#7CAEAD', '#917670', '#CDB486'],
+        'data_ranges': [(3, 7), (7, 11), (11, 15)]
+    },
+    'Question 8': {
+        'categories': QUESTION_CATEGORIES['Question 8'],
+        'colors': ['#7CAEAD'],
+        'data_ranges': [(3, 7)]
+    }
+}
 
-# Let the user upload an Excel file
-uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx"])
+# Category averages for many departments at once.
+# values holds one row per department with the sheet's column M (rows 0 up to the last data row);
+# returns a department x category matrix.
+def category_average_matrix(values, question):
+    averages = np.empty((values.shape[0], len(question['categories'])))
+    for idx, (category, (start_row, end_row)) in enumerate(zip(question['categories'], question['data_ranges'])):
+        block = values[:, start_row:end_row]
+        if category == 'Balance' and 'transform' in question:
+            block = question['transform'](block)
+        averages[:, idx] = block.mean(axis=1)
+    return averages
 
-if uploaded_file:
-    sheet_name = st.selectbox('Select the sheet name', ['Question 4', 'Question 5', 'Question 6', 'Question 7', 'Question 8'])
+# Function to draw one polar chart per department into a single figure
+def create_polar_small_multiples(departments, averages, categories, colors, ncols=5):
+    value_font = default_font_properties(11)
+    fig, axes = new_polar_grid(len(departments), ncols=ncols)
 
-    df = pd.read_excel(uploaded_file, sheet_name=sheet_name, header=None)
-    
-    # Define the structure for each question
-    questions = {
-        'Question 4': {
-            'categories': ['Strategic Alignment', 'Balance', 'Maximal Value'],
-            'colors': ['#7CAEAD', '#917670', '#CDB486'],
-            'data_ranges': [(3, 7), (7, 11), (11, 15)],
-            'transform': lambda values: np.array([values[0], values[3], 5 - values[1], 5 - values[2]])  # Specific transformation for balance
-        },
-        'Question 5': {
-            'categories': ['Portfolio Mindset', 'Focus', 'Agility'],
-            'colors': ['#7CAEAD', '#917670', '#CDB486'],
-            'data_ranges': [(3, 8), (8, 12), (12, 16)]
-        },
-        'Question 6': {
-            'categories': ['Evidence', 'Informal Power', 'Opinion'],
-            'colors': ['#7CAEAD', '#917670', '#CDB486'],
-            'data_ranges': [(3, 7), (7, 11), (11, 15)]
-        },
-        'Question 7': {
-            'categories': ['Cross-functional collaboration', 'Critical thinking', 'Market immersion'],
-            'colors': ['#7CAEAD', '#917670', '#CDB486'],
-            'data_ranges': [(3, 7), (7, 11), (11, 15)]
-        },
-        'Question 8': {
-            'categories': ['Culture'],
-            'colors': ['#7CAEAD'],
-            'data_ranges': [(3, 7)]
-        }
-    }
-    
-    # Extract the relevant information for the selected question
+    segment_angle = 2 * np.pi / len(categories)
+    angles = (np.arange(len(categories)) * segment_angle + segment_angle / 2) % (2 * np.pi)  # Center bars on angles
+    separation_angles = list((angles - segment_angle / 2) % (2 * np.pi)) + [2 * np.pi]
+
+    bars = None
+    for ax, department, row in zip(axes, departments, averages):
+        bars = ax.bar(angles, row, color=colors, alpha=0.75, width=segment_angle)
+        for angle, avg in zip(angles, row):
+            ax.text(angle, avg - 1, f'{avg:.2f}', ha='center', va='bottom', color='black', fontweight='bold', fontproperties=value_font)
+        draw_polar_separators(ax, separation_angles)
+        # File names can be long: wrap to the cell width, at most two lines
+        ax.set_title(textwrap.fill(department, width=22, max_lines=2, placeholder='...'), fontproperties=default_font_properties(13), pad=12)
+        ax.patch.set_alpha(1.0)
+
+    # One legend for the whole grid
+    fig.legend(handles=list(bars), labels=categories, loc='upper center', ncol=len(categories), frameon=False, prop=default_font_properties(14))
+    fig.patch.set_alpha(0.0)
+
+    return fig
+
+# Pipeline stages (load -> extract -> aggregate -> render), memoized per session by pipeline.stage
+
+def read_sheet(workbook, sheet_name):
+    workbook.seek(0)
+    return pd.read_excel(workbook, sheet_name=sheet_name, header=None)
+
+# Extract data from the selected sheet
+def extract_category_data(df, sheet_name):
     question = questions[sheet_name]
-    categories = question['categories']
-    colors = question['colors']
-    data_ranges = question['data_ranges']
-    
-    # Extract data from the selected sheet
     data = {}
-    for idx, category in enumerate(categories):
-        start_row, end_row = data_ranges[idx]
+    for category, (start_row, end_row) in zip(question['categories'], question['data_ranges']):
         data[category] = df.iloc[start_row:end_row, 12].values
-    
-    # Calculate the average values
+    return data
+
+# Calculate the average values
+def category_averages(data, sheet_name):
     if sheet_name == 'Question 4':
         # Apply the transformation to Balance
         balance_values = data['Balance']
-        transformed_balance_values = question['transform'](balance_values)
-        averages = {key: (np.mean(transformed_balance_values) if key == 'Balance' else np.mean(values)) for key, values in data.items()}
-    else:
-        averages = {key: np.mean(values) for key, values in data.items()}
-    
-    # Generate the chart
-    fig = create_polar_chart(data, averages, categories, colors, f"{sheet_name}: Polar Chart")
-    st.pyplot(fig)
+        transformed_balance_values = questions[sheet_name]['transform'](balance_values)
+        return {key: (np.mean(transformed_balance_values) if key == 'Balance' else np.mean(values)) for key, values in data.items()}
+    return {key: np.mean(values) for key, values in data.items()}
 
-    # Save figure to a BytesIO object with high DPI for sharpness
+# Save the chart as PNG bytes; high DPI (600) for the download, DISPLAY_DPI for the screen
+def polar_chart_png(data, averages, sheet_name, dpi=600, bbox_inches=None):
+    question = questions[sheet_name]
+    fig = create_polar_chart(data, averages, question['categories'], question['colors'], f"{sheet_name}: Polar Chart")
     buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=600)  # Save as PNG with high DPI (600)
-    buf.seek(0)  # Move the buffer's position to the beginning
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches=bbox_inches)
+    plt.close(fig)
+    return buf.getvalue()
+
+# Column M of one department workbook as floats, or None if the sheet is missing, too narrow or too short
+def read_department_column(workbook, sheet_name, last_row):
+    try:
+        df = read_sheet(workbook, sheet_name)
+    except ValueError:  # No sheet with this name
+        return None
+    if df.shape[1] <= 12:
+        return None
+    column = df.iloc[:last_row, 12]
+    if len(column) < last_row:
+        return None
+    return pd.to_numeric(column, errors='coerce').to_numpy(dtype=float)
 
-    # Create a download button
-    st.download_button(
-        label=f"Download Chart as High-Quality PNG for {sheet_name}",
-        data=buf,
-        file_name=f"polar_chart_{sheet_name}.png",
-        mime="image/png"
-    )
+def comparison_averages(*columns, sheet_name):
+    return category_average_matrix(np.vstack(columns), questions[sheet_name])
+
+# Draw all departments into one figure and rasterize it once, for both display and download
+def comparison_chart_png(averages, departments, sheet_name):
+    question = questions[sheet_name]
+    fig = create_polar_small_multiples(list(departments), averages, question['categories'], question['colors'])
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=300)
+    plt.close(fig)
+    return buf.getvalue()
+
+# Streamlit app starts here
+start_warm_up()
+st.title("Polar Chart App")
+show_startup_report()
+browser_rendering = use_browser_rendering()
+
+mode = st.radio('Mode', ['Single workbook', 'Compare departments'], horizontal=True)
+
+# Let the user upload an Excel file
+if mode == 'Single workbook':
+    uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx"])
+    uploaded_files = []
+else:
+    uploaded_file = None
+    uploaded_files = st.file_uploader("Choose an Excel file for each department", type=["xlsx"], accept_multiple_files=True)
+
+# Drop the columns of departments that were removed (or of the comparison mode when it is left)
+prune('column_', [f'column_{idx}' for idx in range(len(uploaded_files))])
+
+if uploaded_file:
+    sheet_name = st.selectbox('Select the sheet name', ['Question 4', 'Question 5', 'Question 6', 'Question 7', 'Question 8'])
+
+    # Only the stages downstream of a changed input are recomputed on a rerun
+    workbook = upload_source('workbook', uploaded_file)
+    df = stage('sheet', read_sheet, workbook, sheet_name=sheet_name)
+    data = stage('data', extract_category_data, df, sheet_name=sheet_name)
+    averages = stage('averages', category_averages, data, sheet_name=sheet_name)
+
+    categories = questions[sheet_name]['categories']
+    colors = questions[sheet_name]['colors']
+
+    # Generate the chart; in the browser only the averages are sent and matplotlib is used for the export
+    if browser_rendering:
+        st.vega_lite_chart(polar_chart_spec(averages.value, categories, colors), width='content')
+        export = st.checkbox("Prepare high-quality PNG for download")
+    else:
+        st.image(stage('display_png', polar_chart_png, data, averages, sheet_name=sheet_name, dpi=DISPLAY_DPI, bbox_inches='tight').value)
+        export = True
+
+    if export:
+        png = stage('png', polar_chart_png, data, averages, sheet_name=sheet_name).value
+
+        # Create a download button
+        st.download_button(
+            label=f"Download Chart as High-Quality PNG for {sheet_name}",
+            data=png,
+            file_name=f"polar_chart_{sheet_name}.png",
+            mime="image/png"
+        )
 
     # Show instructions
     st.markdown("""
     ### Instructions:
     1. Upload an Excel file containing the data.
     2. Select the appropriate sheet name.
-    3. View and download the resulting high-quality polar chart.
+    3. View the polar chart and, in interactive mode, tick the export box to download it as a high-quality PNG.
+    """)
+
+if uploaded_files:
+    sheet_name = st.selectbox('Select the sheet name', list(questions.keys()))
+    question = questions[sheet_name]
+    categories = question['categories']
+    colors = question['colors']
+    last_row = max(end_row for _, end_row in question['data_ranges'])
+
+    # Stack column M of every workbook into one department x row matrix
+    departments = []
+    columns = []
+    for idx, department_file in enumerate(uploaded_files):
+        workbook = upload_source(f'workbook_{idx}', department_file)
+        column = stage(f'column_{idx}', read_department_column, workbook, sheet_name=sheet_name, last_row=last_row)
+        if column.value is None:
+            st.warning(f"Skipping {department_file.name}: no sheet '{sheet_name}' with data in column M up to row {last_row}.")
+            continue
+        departments.append(department_file.name.rsplit('.', 1)[0])
+        columns.append(column)
+
+    if departments:
+        averages = stage('comparison_averages', comparison_averages, *columns, sheet_name=sheet_name)
+        st.dataframe(pd.DataFrame(averages.value, index=departments, columns=categories).round(2))
+
+        png = stage('comparison_png', comparison_chart_png, averages, departments=tuple(departments), sheet_name=sheet_name).value
+        st.image(png, width='stretch')
+
+        st.download_button(
+            label=f"Download Comparison Chart as PNG for {sheet_name}",
+            data=png,
+            file_name=f"polar_chart_comparison_{sheet_name}.png",
+            mime="image/png"
+        )
+
+    st.markdown("""
+    ### Instructions:
+    1. Upload one Excel file per department; the file name is used as the department name.
+    2. Select the appropriate sheet name.
+    3. Compare the departments side by side and download the combined chart.
     """)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared startup helpers for the chart apps.
+
+Heavy modules (numpy, pandas, matplotlib) are imported on first use instead of
+at the top of each app, and a background thread warms the matplotlib font
+cache and the polar chart margins of the known legends once per process, so
+the first chart of a new session does not pay for it.
+"""
+
+import functools
+import importlib
+import sys
+import threading
+import time
+
+import streamlit as st
+
+# Modules the chart apps need, in the order they are warmed up
+HEAVY_MODULES = ['numpy', 'matplotlib', 'matplotlib.pyplot', 'pandas', 'openpyxl']
+
+# First-import cost in seconds per module, shared by all sessions in this process
+import_timings = {}
+
+_warm_up_thread = None
+_warm_up_seconds = None
+_warm_up_error = None
+_import_lock = threading.Lock()
+_start_lock = threading.Lock()
+
+
+# Import a module and record how long the first import took
+def _timed_import(name):
+    # Already loaded (or being loaded): importlib waits only for that module's own import
+    if name in sys.modules:
+        return importlib.import_module(name)
+    with _import_lock:
+        if name in sys.modules:
+            return importlib.import_module(name)
+        if name.startswith('matplotlib') and 'matplotlib.pyplot' not in sys.modules:
+            # Select the non-interactive backend before pyplot is ever imported
+            start = time.perf_counter()
+            matplotlib = importlib.import_module('matplotlib')
+            matplotlib.use('Agg')
+            import_timings.setdefault('matplotlib', time.perf_counter() - start)
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        import_timings.setdefault(name, time.perf_counter() - start)
+        return module
+
+
+# Module stand-in that performs the real import on first attribute access
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = _timed_import(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+# Font used for chart text; built on first use so the font cache is not scanned at import
+@functools.lru_cache(maxsize=None)
+def default_font_properties(size=18):
+    from matplotlib.font_manager import FontProperties
+    return FontProperties(family='sans-serif', size=size)
+
+
+def _warm_up():
+    global _warm_up_seconds, _warm_up_error
+    start = time.perf_counter()
+    try:
+        for name in HEAVY_MODULES:
+            _timed_import(name)
+
+        # Resolve the sans-serif font once; this populates the font cache on fresh containers
+        from matplotlib import font_manager
+        font_manager.findfont(default_font_properties())
+
+        # Measure the polar chart margins for every known legend, so the first chart
+        # of a session reuses them instead of laying out a template figure itself
+        from chart_style import warm_polar_margins
+        warm_polar_margins()
+    except Exception as e:
+        _warm_up_error = f"{type(e).__name__}: {e}"
+    finally:
+        _warm_up_seconds = time.perf_counter() - start
+
+
+# Start the per-process warm-up in the background; later calls are no-ops
+def start_warm_up():
+    global _warm_up_thread
+    with _start_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=_warm_up, name='chart-warm-up', daemon=True)
+            _warm_up_thread.start()
+
+
+# Show the import and warm-up cost of this process in the sidebar
+def show_startup_report():
+    with st.sidebar.expander("Startup timings"):
+        if _warm_up_seconds is None:
+            st.write("Warm-up still running...")
+        elif _warm_up_error is not None:
+            st.write(f"Warm-up failed after {_warm_up_seconds:.2f} s: {_warm_up_error}")
+        else:
+            st.write(f"Warm-up: {_warm_up_seconds:.2f} s")
+        # Snapshot: the warm-up thread may still be adding entries while this loop writes
+        for name, seconds in list(import_timings.items()):
+            st.write(f"`{name}`: {seconds:.2f} s")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-session temp store for uploaded workbooks and a per-session memory budget.
+
+Uploads are copied to a temporary directory owned by the session and the
+file uploader is then reset under a new key, so the app keeps no reference to
+the uploaded bytes and reads workbooks from disk only. The directory is
+removed when the session state is garbage collected.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import streamlit as st
+
+from pipeline import upload_token
+
+# Memory the app may hold per session for extracted tables and rendered charts
+MEMORY_BUDGET_MB = float(os.environ.get('SESSION_MEMORY_BUDGET_MB', 64))
+
+_STORE_KEY = '_upload_store'
+_RECORDS_KEY = '_stored_uploads'
+_GENERATION_KEY = '_uploader_generation'
+_REJECTED_KEY = '_rejected_uploads'
+
+
+def _store_dir():
+    if _STORE_KEY not in st.session_state:
+        st.session_state[_STORE_KEY] = tempfile.TemporaryDirectory(prefix='uploads_')
+    return st.session_state[_STORE_KEY].name
+
+
+# Workbooks in the store, in upload order: dicts with token, name, path and size
+def stored_uploads():
+    return st.session_state.setdefault(_RECORDS_KEY, [])
+
+
+# Widget key of the file uploader; it changes every time the uploader is reset
+def uploader_key(prefix):
+    return f"{prefix}_{st.session_state.get(_GENERATION_KEY, 0)}"
+
+
+# Copy new uploads to the store, then reset the uploader so Streamlit can drop their bytes
+def take_uploads(uploaded_files):
+    records = stored_uploads()
+    known = {record['token'] for record in records}
+    for uploaded_file in uploaded_files:
+        token = upload_token(uploaded_file)
+        if token in known:
+            continue
+        path = os.path.join(_store_dir(), hashlib.sha1(token.encode('utf-8')).hexdigest() + '.xlsx')
+        uploaded_file.seek(0)
+        with open(path + '.part', 'wb') as f:
+            shutil.copyfileobj(uploaded_file, f)
+        os.replace(path + '.part', path)
+        records.append({'token': token, 'name': uploaded_file.name, 'path': path, 'size': os.path.getsize(path)})
+        known.add(token)
+    st.session_state[_GENERATION_KEY] = st.session_state.get(_GENERATION_KEY, 0) + 1
+    st.rerun()
+
+
+def remove_upload(token):
+    records = stored_uploads()
+    for record in [record for record in records if record['token'] == token]:
+        if os.path.exists(record['path']):
+            os.remove(record['path'])
+        records.remove(record)
+    # Removing a workbook frees budget, so earlier rejections may fit now
+    rejected_uploads().clear()
+
+
+def stored_bytes():
+    return sum(record['size'] for record in stored_uploads())
+
+
+# Tokens of uploads that did not fit in the memory budget; they are not read again
+def rejected_uploads():
+    return st.session_state.setdefault(_REJECTED_KEY, set())
+
+
+def memory_budget_bytes():
+    return int(MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+# Sidebar summary of the session's memory use against the budget
+def show_memory_report(used_bytes):
+    budget = memory_budget_bytes()
+    with st.sidebar:
+        st.caption(f"Session memory: {used_bytes / 1024 ** 2:.1f} MB of {MEMORY_BUDGET_MB:.0f} MB")
+        st.progress(min(used_bytes / budget, 1.0))
+        st.caption(f"{len(stored_uploads())} workbook(s) stored on disk: {stored_bytes() / 1024 ** 2:.1f} MB")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vega-Lite versions of the survey charts, rendered in the browser.
+
+Only the numbers behind a chart are sent to the client, so reruns do not
+rasterize anything on the server. The specs follow the matplotlib layout:
+0 degrees at the top, segments running clockwise, radial scale 0-5 with
+grid circles at 1-5 and dashed separators between segments. The matplotlib
+figures are still used for the high-quality PNG downloads.
+"""
+
+import math
+
+import streamlit as st
+
+CHART_SIZE = 460  # Pixels
+GRID_COLOR = '#b0b0b0'  # matplotlib's default grid colour
+
+
+# Sidebar switch between browser rendering and server-side matplotlib images
+def use_browser_rendering():
+    backend = st.sidebar.radio('Chart rendering', ['Interactive (browser)', 'Image (server)'])
+    return backend == 'Interactive (browser)'
+
+
+# JSON-safe number: NaN/inf (empty or non-numeric cells) become null, which Vega-Lite leaves out
+def _number(value, digits=4):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return round(value, digits) if math.isfinite(value) else None
+
+
+def _radius_scale():
+    return {'type': 'linear', 'domain': [0, 5], 'range': [0, CHART_SIZE / 2 - 10], 'zero': True}
+
+
+# Grid circles and dashed separators shared by the polar layouts
+def _polar_background(separator_angles):
+    grid = {
+        'data': {'values': [{'r': r} for r in range(1, 6)]},
+        'mark': {'type': 'arc', 'fill': None, 'stroke': GRID_COLOR, 'strokeWidth': 0.75},
+        'encoding': {
+            'theta': {'value': 0},
+            'theta2': {'value': 2 * math.pi},
+            'radius': {'field': 'r', 'type': 'quantitative', 'scale': _radius_scale()},
+            'radius2': {'field': 'r'},
+        },
+    }
+    # A zero-width wedge from the centre to the edge draws a radial line
+    separators = {
+        'data': {'values': [{'angle': float(angle)} for angle in separator_angles]},
+        'mark': {'type': 'arc', 'fill': None, 'stroke': 'gray', 'strokeWidth': 1, 'strokeDash': [4, 2]},
+        'encoding': {
+            'theta': {'field': 'angle', 'type': 'quantitative', 'scale': None},
+            'theta2': {'field': 'angle'},
+            'radius': {'value': CHART_SIZE / 2 - 10},
+        },
+    }
+    return [grid, separators]
+
+
+# Polar chart of the category averages, as drawn by create_polar_chart
+def polar_chart_spec(averages, categories, colors):
+    segment_angle = 2 * math.pi / len(categories)
+    values = [
+        {'category': category, 'average': _number(averages[category]),
+         'start': i * segment_angle, 'end': (i + 1) * segment_angle, 'middle': (i + 0.5) * segment_angle}
+        for i, category in enumerate(categories)
+    ]
+    color = {'field': 'category', 'type': 'nominal', 'scale': {'domain': categories, 'range': colors},
+             'legend': {'orient': 'top-right', 'title': None, 'labelFontSize': 14}}
+    bars = {
+        'mark': {'type': 'arc', 'opacity': 0.75},
+        'encoding': {
+            'theta': {'field': 'start', 'type': 'quantitative', 'scale': None},
+            'theta2': {'field': 'end'},
+            'radius': {'field': 'average', 'type': 'quantitative', 'scale': _radius_scale()},
+            'color': color,
+            'tooltip': [{'field': 'category'}, {'field': 'average', 'format': '.2f'}],
+        },
+    }
+    labels = {
+        'transform': [{'filter': 'isValid(datum.average)'}, {'calculate': 'datum.average - 1', 'as': 'label_radius'}],
+        'mark': {'type': 'text', 'fontWeight': 'bold', 'fontSize': 14, 'baseline': 'bottom'},
+        'encoding': {
+            'theta': {'field': 'middle', 'type': 'quantitative', 'scale': None},
+            'radius': {'field': 'label_radius', 'type': 'quantitative', 'scale': _radius_scale()},
+            'text': {'field': 'average', 'format': '.2f'},
+        },
+    }
+    separator_angles = [i * segment_angle for i in range(len(categories))]
+    return {
+        'width': CHART_SIZE,
+        'height': CHART_SIZE,
+        'data': {'values': values},
+        'layer': _polar_background(separator_angles) + [bars, labels],
+        'view': {'stroke': None},
+    }
+
+
+# Radar chart of the per-statement values with one category highlighted, as drawn by create_radar_chart
+def radar_chart_spec(data, categories, highlight, colors, light_colors):
+    segment_angle = 2 * math.pi / len(categories)
+    values = []
+    for i, (category, statement_values) in enumerate(data.items()):
+        base_angle = i * segment_angle
+        sub_segment_width = segment_angle / len(statement_values)
+        offset = 0.21 if len(statement_values) == 5 else 0.265
+        for j, value in enumerate(statement_values):
+            sub_angle = base_angle + offset + j * sub_segment_width
+            values.append({
+                'category': category, 'statement': j + 1, 'value': _number(value),
+                'start': sub_angle - sub_segment_width / 2, 'end': sub_angle + sub_segment_width / 2, 'middle': sub_angle,
+                'color': colors[i] if i == highlight else light_colors[i], 'highlighted': i == highlight,
+            })
+    bars = {
+        'mark': {'type': 'arc', 'opacity': 0.75, 'stroke': 'white'},
+        'encoding': {
+            'theta': {'field': 'start', 'type': 'quantitative', 'scale': None},
+            'theta2': {'field': 'end'},
+            'radius': {'field': 'value', 'type': 'quantitative', 'scale': _radius_scale()},
+            'color': {'field': 'color', 'type': 'nominal', 'scale': None},
+            'tooltip': [{'field': 'category'}, {'field': 'statement'}, {'field': 'value', 'format': '.2f'}],
+        },
+    }
+    labels = {
+        'transform': [{'filter': 'datum.highlighted && isValid(datum.value)'}, {'calculate': 'datum.value - 0.75', 'as': 'label_radius'}],
+        'mark': {'type': 'text', 'fontWeight': 'bold', 'fontSize': 13},
+        'encoding': {
+            'theta': {'field': 'middle', 'type': 'quantitative', 'scale': None},
+            'radius': {'field': 'label_radius', 'type': 'quantitative', 'scale': _radius_scale()},
+            'text': {'field': 'value', 'format': '.2f'},
+        },
+    }
+    separator_angles = [i * segment_angle for i in range(len(categories))]
+    return {
+        'title': categories[highlight],
+        'width': CHART_SIZE,
+        'height': CHART_SIZE,
+        'data': {'values': values},
+        'layer': _polar_background(separator_angles) + [bars, labels],
+        'view': {'stroke': None},
+    }
+
+
+# Horizontal stacked bar chart of the response percentages per department
+def stacked_percentage_spec(df_percentage, title, colors):
+    responses = list(df_percentage.columns)
+    values = [
+        {'department': str(department), 'response': response, 'order': k, 'percentage': _number(row[response], 2)}
+        for department, row in df_percentage.iterrows()
+        for k, response in enumerate(responses)
+    ]
+    return {
+        'title': title,
+        'width': 640,
+        'height': {'step': 36},
+        'data': {'values': values},
+        'mark': {'type': 'bar'},
+        'encoding': {
+            'y': {'field': 'department', 'type': 'nominal', 'title': 'Department', 'axis': {'ticks': False}},
+            'x': {'field': 'percentage', 'type': 'quantitative', 'stack': True, 'title': 'Percentage of Responses',
+                  'scale': {'domain': [0, 100]},
+                  'axis': {'values': list(range(0, 101, 10)), 'labelExpr': "datum.value + '%'", 'gridDash': [4, 2], 'gridColor': 'gray'}},
+            'color': {'field': 'response', 'type': 'nominal', 'scale': {'domain': responses, 'range': colors},
+                      'legend': {'orient': 'bottom', 'columns': 5, 'title': 'Response'}},
+            'order': {'field': 'order'},
+            'tooltip': [{'field': 'department'}, {'field': 'response'}, {'field': 'percentage', 'format': '.1f'}],
+        },
+        'config': {'view': {'stroke': None}, 'axis': {'domain': False}},
+    }